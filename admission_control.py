@@ -0,0 +1,263 @@
+"""
+Admission control for the /chat endpoint
+
+Keeps the assistant responsive under load spikes:
+  * RateLimiter      per-client token buckets, rejected with 429
+  * AdmissionController  bounded concurrency with a bounded wait queue,
+                     shed with 503 once the queue is full or a wait times out
+
+Both rejections carry a Retry-After hint. Endpoints that do not go through
+the controller (such as /health) are never queued behind chat traffic.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is refused by rate limiting or load shedding"""
+
+    def __init__(self, status_code: int, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def _env_number(name: str, default: float) -> float:
+    """Read a numeric setting from the environment"""
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def parse_trusted_proxies(value: str) -> List[Any]:
+    """Parse a comma-separated list of proxy addresses or CIDR ranges"""
+    return [
+        ipaddress.ip_network(entry.strip(), strict=False)
+        for entry in value.split(",")
+        if entry.strip()
+    ]
+
+
+def _is_trusted(address: str, trusted_proxies: List[Any]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in trusted_proxies)
+
+
+def client_key(request: Request, trusted_proxies: List[Any] = ()) -> str:
+    """
+    Identify the client for rate limiting
+    X-Forwarded-For is only honoured when the direct peer is a trusted
+    proxy (such as the OpenShift router). Each proxy appends the address
+    it saw, so the entries are walked right to left and the first one
+    that is not itself a trusted proxy is the client.
+    """
+    peer = request.client.host if request.client else "unknown"
+    if not _is_trusted(peer, trusted_proxies):
+        return peer
+
+    forwarded = request.headers.get("x-forwarded-for")
+    if not forwarded:
+        return peer
+    hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop, trusted_proxies):
+            return hop
+    return hops[0] if hops else peer
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at rate tokens/second"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """
+        Take one token
+        Returns:
+            0 if a token was available, otherwise seconds until one is
+        """
+        now = time.monotonic()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Per-client token bucket rate limiter with a bounded client table"""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        max_clients: int = 10000,
+        trusted_proxies: List[Any] = (),
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.trusted_proxies = list(trusted_proxies)
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.rejected = 0
+
+    def check(self, key: str) -> None:
+        """
+        Charge one request to a client
+        Raises:
+            AdmissionRejected: With status 429 if the client is over its rate
+        """
+        if self.rate <= 0:
+            return
+
+        bucket = self.buckets.pop(key, None)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+            if len(self.buckets) >= self.max_clients:
+                # Forget the least recently seen client
+                self.buckets.popitem(last=False)
+        self.buckets[key] = bucket
+
+        wait = bucket.take()
+        if wait:
+            self.rejected += 1
+            raise AdmissionRejected(
+                429, max(1, math.ceil(wait)), "Rate limit exceeded"
+            )
+
+
+class AdmissionController:
+    """
+    Concurrency limiter with a bounded wait queue
+
+    At most max_concurrent requests run at once and at most max_queue wait
+    for a slot. Anything beyond that, or anything that waits longer than
+    queue_timeout seconds, is shed immediately instead of piling up.
+    """
+
+    def __init__(
+        self, max_concurrent: int, max_queue: int, queue_timeout: float
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        # Moving average of time spent holding a slot, for Retry-After
+        self.avg_service_time = 0.0
+
+    def retry_after(self) -> int:
+        """Estimate seconds until the current backlog drains"""
+        backlog = (self.queued + self.active) / self.max_concurrent
+        return max(1, math.ceil(backlog * self.avg_service_time))
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Hold a concurrency slot for the duration of the block
+        Raises:
+            AdmissionRejected: With status 503 if the request is shed
+        """
+        if self._slots.locked():
+            if self.queued >= self.max_queue:
+                self.shed_queue_full += 1
+                raise AdmissionRejected(
+                    503, self.retry_after(), "Server busy, queue full"
+                )
+
+            self.queued += 1
+            try:
+                await asyncio.wait_for(
+                    self._slots.acquire(), timeout=self.queue_timeout
+                )
+            except asyncio.TimeoutError:
+                self.shed_timeout += 1
+                raise AdmissionRejected(
+                    503, self.retry_after(), "Server busy, queue timeout"
+                )
+            finally:
+                self.queued -= 1
+        else:
+            await self._slots.acquire()
+
+        self.active += 1
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self.avg_service_time += 0.1 * (elapsed - self.avg_service_time)
+            self.active -= 1
+            self._slots.release()
+
+    def stats(
+        self, rate_limiter: Optional[RateLimiter] = None
+    ) -> Dict[str, Any]:
+        """Snapshot of queue depth and shed counters"""
+        stats = {
+            "active": self.active,
+            "queue_depth": self.queued,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_timeout": self.shed_timeout,
+            "avg_service_time": round(self.avg_service_time, 3),
+        }
+        if rate_limiter is not None:
+            stats["rate_limited"] = rate_limiter.rejected
+        return stats
+
+
+def controller_from_env() -> AdmissionController:
+    """Build the /chat admission controller from environment settings"""
+    return AdmissionController(
+        max_concurrent=int(_env_number("CHAT_MAX_CONCURRENT", 8)),
+        max_queue=int(_env_number("CHAT_MAX_QUEUE", 32)),
+        queue_timeout=_env_number("CHAT_QUEUE_TIMEOUT", 5.0),
+    )
+
+
+def rate_limiter_from_env() -> RateLimiter:
+    """Build the per-client /chat rate limiter from environment settings"""
+    limiter = RateLimiter(
+        rate=_env_number("CHAT_RATE_LIMIT", 2.0),
+        burst=_env_number("CHAT_RATE_BURST", 10.0),
+        trusted_proxies=parse_trusted_proxies(
+            os.getenv("CHAT_TRUSTED_PROXIES", "")
+        ),
+    )
+    if limiter.rate > 0 and not limiter.trusted_proxies:
+        logger.warning(
+            "CHAT_TRUSTED_PROXIES is empty: clients behind a proxy or "
+            "router will share a single rate-limit bucket"
+        )
+    return limiter
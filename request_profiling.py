@@ -0,0 +1,472 @@
+"""
+Opt-in per-request profiling for the retail assistant
+
+A request is profiled when an admin sends an X-Profile header or it is
+picked by the PROFILE_SAMPLE_RATE sampler. Profiled requests record a span
+tree for each stage (intent parsing, MCP tool calls, response formatting)
+and can optionally run under cProfile:
+
+    X-Profile: 1          span tree only
+    X-Profile: cprofile   span tree plus cProfile statistics
+
+cProfile hooks the whole event-loop thread, so its output also covers any
+other request that ran while the session was open. Such traces are marked
+with profile.cprofile_scope=thread and the number of overlapping requests.
+
+Finished traces are appended to a rotating file as OpenTelemetry (OTLP/JSON)
+ResourceSpans, one per line, by a background thread, and the most recent
+ones are kept in memory for the admin endpoints. When a request is not
+profiled, span() and traced() cost a single context variable lookup.
+"""
+
+import atexit
+import cProfile
+import functools
+import inspect
+import io
+import json
+import logging
+import logging.handlers
+import os
+import pstats
+import queue
+import random
+import secrets
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "retail-ai-assistant"
+
+_SPAN_KIND_INTERNAL = 1
+_SPAN_KIND_SERVER = 2
+_STATUS_ERROR = 2
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar(
+    "current_span", default=None
+)
+
+
+class Span:
+    """A timed stage of a profiled request"""
+
+    __slots__ = (
+        "trace",
+        "span_id",
+        "parent_id",
+        "name",
+        "kind",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "error",
+    )
+
+    def __init__(
+        self,
+        trace: "Trace",
+        name: str,
+        parent: Optional["Span"] = None,
+        kind: int = _SPAN_KIND_INTERNAL,
+    ):
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else ""
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        trace.spans.append(self)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": (
+                {"code": _STATUS_ERROR, "message": self.error}
+                if self.error
+                else {}
+            ),
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class Trace:
+    """All spans recorded for one profiled request"""
+
+    def __init__(self, name: str, mode: str):
+        self.trace_id = secrets.token_hex(16)
+        self.mode = mode
+        self.spans: List[Span] = []
+        self.root = Span(self, name, kind=_SPAN_KIND_SERVER)
+        self.cprofile: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.root.end_ns - self.root.start_ns) / 1e6
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.root.name,
+            "mode": self.mode,
+            "start_time_unix_nano": self.root.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "spans": len(self.spans),
+            "has_cprofile": self.cprofile is not None,
+            "cprofile_scope": self.root.attributes.get(
+                "profile.cprofile_scope"
+            ),
+            "cprofile_overlapping_requests": self.root.attributes.get(
+                "profile.cprofile_overlapping_requests"
+            ),
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Encode as an OTLP/JSON ResourceSpans document"""
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": _otlp_attributes(
+                            {"service.name": SERVICE_NAME}
+                        )
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [span.to_otlp() for span in self.spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [
+        {"key": key, "value": _otlp_value(value)}
+        for key, value in attributes.items()
+    ]
+
+
+class _NoopSpan:
+    """Stand-in returned by span() when the request is not profiled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _SpanContext:
+    """Context manager that records a child span of the current span"""
+
+    __slots__ = ("parent", "name", "attributes", "span", "token")
+
+    def __init__(self, parent: Span, name: str, attributes: Dict[str, Any]):
+        self.parent = parent
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> Span:
+        self.span = Span(self.parent.trace, self.name, self.parent)
+        self.span.attributes.update(self.attributes)
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.end()
+        if exc is not None:
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self.token)
+        return False
+
+
+def span(name: str, **attributes: Any):
+    """
+    Record a stage of the current request as a child span
+    Args:
+        name: Span name
+        **attributes: Span attributes
+    Returns:
+        Context manager yielding the span (a no-op when not profiling)
+    """
+    parent = _current_span.get()
+    if parent is None:
+        return _NOOP_SPAN
+    return _SpanContext(parent, name, attributes)
+
+
+def traced(name: str):
+    """Decorator that records each call of a function as a span"""
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                parent = _current_span.get()
+                if parent is None:
+                    return await func(*args, **kwargs)
+                with _SpanContext(parent, name, {}):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            parent = _current_span.get()
+            if parent is None:
+                return func(*args, **kwargs)
+            with _SpanContext(parent, name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class _TraceQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that passes the Trace through unformatted"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The default formats the message on the calling thread
+        return record
+
+
+class _OtlpJsonFormatter(logging.Formatter):
+    """Encode a queued Trace as one OTLP/JSON line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg.to_otlp(), separators=(",", ":"))
+
+
+class RequestProfiler:
+    """
+    Decides which requests to profile, runs them and keeps the results
+    Args:
+        sample_rate: Fraction of requests profiled without a header
+        trace_file: Rotating OTLP/JSON lines file, empty to disable export
+        max_bytes: Size at which the trace file rotates
+        backup_count: Rotated trace files to keep
+        keep: Traces retained in memory for the admin endpoints
+        cprofile_limit: Functions listed in cProfile output
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        trace_file: str = "",
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+        keep: int = 100,
+        cprofile_limit: int = 40,
+    ):
+        self.sample_rate = sample_rate
+        self.trace_file = trace_file
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.keep = keep
+        self.cprofile_limit = cprofile_limit
+        self.traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self._cprofile_active = False
+        # Requests currently being handled / ever started, used to report
+        # how many other requests shared a thread-wide cProfile session
+        self.in_flight = 0
+        self.started = 0
+        self._export_logger: Optional[logging.Logger] = None
+        self._export_listener: Optional[
+            logging.handlers.QueueListener
+        ] = None
+        if self.trace_file:
+            self._start_export()
+
+    def mode_for(self, headers, allow_header: bool = True) -> Optional[str]:
+        """
+        Return the profiling mode for a request, or None to skip profiling
+        Args:
+            headers: Request headers
+            allow_header: Whether an X-Profile header may be honoured
+        """
+        requested = ""
+        if allow_header:
+            requested = headers.get("x-profile", "").strip().lower()
+        if requested == "cprofile":
+            return "cprofile"
+        if requested in ("1", "true", "yes", "trace"):
+            return "trace"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "trace"
+        return None
+
+    @contextmanager
+    def track_request(self):
+        """Count a request as in flight, profiled or not"""
+        self.in_flight += 1
+        self.started += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    @contextmanager
+    def profile(self, name: str, mode: str = "trace"):
+        """
+        Profile the enclosed block as one request
+        Args:
+            name: Root span name
+            mode: "trace" for spans only, "cprofile" to also run cProfile
+        Yields:
+            The Trace being recorded
+        """
+        trace = Trace(name, mode)
+        token = _current_span.set(trace.root)
+
+        profiler = None
+        if mode == "cprofile":
+            # cProfile hooks the whole thread, so only one request at a time
+            if self._cprofile_active:
+                trace.root.set_attribute("profile.cprofile_skipped", True)
+            else:
+                self._cprofile_active = True
+                trace.root.set_attribute("profile.cprofile_scope", "thread")
+                # Others already running, plus any that start later
+                overlapping_before = max(0, self.in_flight - 1)
+                started_before = self.started
+                profiler = cProfile.Profile()
+                profiler.enable()
+
+        try:
+            yield trace
+        except BaseException as e:
+            trace.root.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self._cprofile_active = False
+                trace.cprofile = self._format_cprofile(profiler)
+                trace.root.set_attribute(
+                    "profile.cprofile_overlapping_requests",
+                    overlapping_before + self.started - started_before,
+                )
+            trace.root.end()
+            _current_span.reset(token)
+            self.record(trace)
+
+    def _format_cprofile(self, profiler: cProfile.Profile) -> str:
+        output = io.StringIO()
+        stats = pstats.Stats(profiler, stream=output)
+        stats.sort_stats("cumulative").print_stats(self.cprofile_limit)
+        return output.getvalue()
+
+    def record(self, trace: Trace) -> None:
+        """Keep a finished trace in memory and queue it for the trace file"""
+        self.traces[trace.trace_id] = trace
+        while len(self.traces) > self.keep:
+            self.traces.popitem(last=False)
+
+        if self._export_logger is not None:
+            # Only enqueued here; encoding and disk I/O happen on the
+            # listener thread so the event loop never waits on them
+            self._export_logger.info(trace)
+
+    def _start_export(self) -> None:
+        """Open the trace file and start the background writer thread"""
+        try:
+            directory = os.path.dirname(self.trace_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                self.trace_file,
+                maxBytes=self.max_bytes,
+                backupCount=self.backup_count,
+            )
+        except OSError as e:
+            # Keep profiling in memory rather than failing requests
+            logger.warning(
+                "Disabling trace export to %s: %s", self.trace_file, e
+            )
+            self.trace_file = ""
+            return
+
+        handler.setFormatter(_OtlpJsonFormatter())
+        export_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._export_listener = logging.handlers.QueueListener(
+            export_queue, handler
+        )
+        self._export_listener.start()
+        atexit.register(self.close)
+
+        export_logger = logging.getLogger(f"{__name__}.export.{id(self)}")
+        export_logger.setLevel(logging.INFO)
+        export_logger.propagate = False
+        export_logger.addHandler(_TraceQueueHandler(export_queue))
+        self._export_logger = export_logger
+
+    def close(self) -> None:
+        """Flush queued traces to the trace file and stop the writer"""
+        listener = self._export_listener
+        if listener is None:
+            return
+        self._export_listener = None
+        self._export_logger = None
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+    def recent(self) -> List[Dict[str, Any]]:
+        """Summaries of retained traces, newest first"""
+        return [trace.summary() for trace in reversed(self.traces.values())]
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        return self.traces.get(trace_id)
+
+
+def profiler_from_env() -> RequestProfiler:
+    """Build the request profiler from environment settings"""
+    return RequestProfiler(
+        sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE") or 0),
+        trace_file=os.getenv("PROFILE_TRACE_FILE", "traces/traces.jsonl"),
+        max_bytes=int(
+            os.getenv("PROFILE_TRACE_MAX_BYTES") or 10 * 1024 * 1024
+        ),
+        backup_count=int(os.getenv("PROFILE_TRACE_BACKUPS") or 5),
+    )
@@ -0,0 +1,526 @@
+"""
+Binary snapshot format for the retail data store
+
+A snapshot is a versioned, checksummed file that holds the loaded retail
+data together with its prebuilt search index. It is laid out as fixed-width
+columns plus a shared string table so it can be memory-mapped and queried
+without re-parsing retail_data.json on every restart.
+
+Layout (all integers little-endian):
+    header   magic, version, section count, source size/mtime, CRC32 of
+             the whole file with the CRC field zeroed
+    table    one (name, offset, length) entry per section
+    payload  8-byte aligned sections (columns, string table, JSON blobs)
+
+Build a snapshot next to the JSON file:
+    python retail_snapshot.py build retail_data.json
+
+Compare cold JSON load against snapshot load:
+    python retail_snapshot.py bench --skus 1000000
+"""
+
+import argparse
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import time
+import zlib
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"RTLSNAP\x00"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_SUFFIX = ".snap"
+
+# magic, version, reserved, section count, source size, source mtime_ns, crc32
+_HEADER = struct.Struct("<8sHHIQQI4x")
+_SECTION = struct.Struct("<8sQQ")
+_CRC_OFFSET = struct.calcsize("<8sHHIQQ")
+_ALIGN = 8
+
+# Largest integer a float64 price column holds exactly
+_MAX_EXACT_INT = 2**53
+
+_INVENTORY_KEYS = {
+    "product_id",
+    "name",
+    "category",
+    "sizes",
+    "price",
+    "colors",
+    "location",
+}
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot is missing, corrupt, stale or unsupported"""
+
+
+def default_snapshot_path(data_file: str) -> str:
+    """Return the snapshot path that sits next to a JSON data file"""
+    return str(Path(data_file).with_suffix(SNAPSHOT_SUFFIX))
+
+
+class NameIndex:
+    """
+    Substring index over lower-cased product names
+
+    Names are stored as one newline-terminated text so a query is a handful
+    of C-level find() calls instead of a Python loop over every product.
+    The text can be a str (built from JSON) or a bytes-like view into a
+    memory-mapped snapshot.
+    """
+
+    def __init__(
+        self,
+        text: Union[str, bytes, mmap.mmap],
+        starts: Sequence,
+        base: int = 0,
+    ):
+        self.text = text
+        self.starts = starts
+        self.base = base
+
+    @classmethod
+    def build(cls, names: List[str]) -> "NameIndex":
+        """Build an in-memory index from product names"""
+        lowered = [name.lower() for name in names]
+        starts = [0]
+        for name in lowered:
+            starts.append(starts[-1] + len(name) + 1)
+        return cls("".join(name + "\n" for name in lowered), starts)
+
+    def __len__(self) -> int:
+        return len(self.starts) - 1
+
+    def match(self, query: str) -> List[int]:
+        """Return row numbers whose name contains query (case-insensitive)"""
+        needle: Union[str, bytes] = query.lower()
+        if not needle:
+            return list(range(len(self)))
+        if not isinstance(self.text, str):
+            needle = needle.encode("utf-8")
+
+        base = self.base
+        end = base + self.starts[-1]
+        rows = []
+        pos = self.text.find(needle, base, end)
+        while pos != -1:
+            row = bisect.bisect_right(self.starts, pos - base) - 1
+            row_end = base + self.starts[row + 1] - 1
+            if pos + len(needle) <= row_end:
+                rows.append(row)
+                pos = self.text.find(needle, row_end + 1, end)
+            else:
+                # Match runs across the row separator, keep looking
+                pos = self.text.find(needle, pos + 1, end)
+        return rows
+
+
+class SnapshotInventory(Sequence):
+    """
+    Read-only inventory backed by snapshot columns
+
+    Items are materialised into plain dicts only when accessed, so loading
+    a snapshot costs the same regardless of catalog size.
+    """
+
+    def __init__(self, sections: Dict[str, memoryview]):
+        self._strs_off = sections["strs.off"].cast("Q")
+        self._strs_dat = sections["strs.dat"]
+        self._ids = sections["inv.id"].cast("I")
+        self._names = sections["inv.name"].cast("I")
+        self._categories = sections["inv.cat"].cast("I")
+        self._locations = sections["inv.loc"].cast("I")
+        self._prices = sections["inv.prc"].cast("d")
+        self._price_is_int = sections["inv.prty"].cast("B")
+        self._size_ix = sections["inv.szix"].cast("I")
+        self._size_labels = sections["inv.szlb"].cast("I")
+        self._size_stock = sections["inv.szqt"].cast("q")
+        self._color_ix = sections["inv.clix"].cast("I")
+        self._colors = sections["inv.clr"].cast("I")
+
+    def _str(self, string_id: int) -> str:
+        start, end = self._strs_off[string_id], self._strs_off[string_id + 1]
+        return bytes(self._strs_dat[start:end]).decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("inventory index out of range")
+
+        sizes = {}
+        for j in range(self._size_ix[index], self._size_ix[index + 1]):
+            sizes[self._str(self._size_labels[j])] = self._size_stock[j]
+        colors = [
+            self._str(self._colors[j])
+            for j in range(self._color_ix[index], self._color_ix[index + 1])
+        ]
+        return {
+            "product_id": self._str(self._ids[index]),
+            "name": self._str(self._names[index]),
+            "category": self._str(self._categories[index]),
+            "sizes": sizes,
+            "price": (
+                int(self._prices[index])
+                if self._price_is_int[index]
+                else self._prices[index]
+            ),
+            "colors": colors,
+            "location": self._str(self._locations[index]),
+        }
+
+
+class _StringTable:
+    """Interning string table used while writing a snapshot"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.offsets = [0]
+        self.chunks: List[bytes] = []
+
+    def add(self, value: str) -> int:
+        string_id = self.ids.get(value)
+        if string_id is None:
+            encoded = value.encode("utf-8")
+            string_id = len(self.chunks)
+            self.ids[value] = string_id
+            self.chunks.append(encoded)
+            self.offsets.append(self.offsets[-1] + len(encoded))
+        return string_id
+
+
+def _checksum(header: bytes, body) -> int:
+    """CRC32 over the header (with its CRC field zeroed) and the body"""
+    zeroed = bytearray(header)
+    zeroed[_CRC_OFFSET:_CRC_OFFSET + 4] = b"\x00" * 4
+    return zlib.crc32(body, zlib.crc32(zeroed))
+
+
+def _column(fmt: str, values) -> bytes:
+    return struct.pack(f"<{len(values)}{fmt}", *values)
+
+
+def _check_price(item: Dict[str, Any]) -> bool:
+    """Validate a price and return True if it is stored as an int"""
+    price = item["price"]
+    if isinstance(price, bool) or not isinstance(price, (int, float)):
+        raise ValueError(
+            f"Unsupported price for snapshot in {item['product_id']}: "
+            f"{price!r}"
+        )
+    if isinstance(price, int):
+        if abs(price) > _MAX_EXACT_INT:
+            raise ValueError(
+                f"Price too large for snapshot in {item['product_id']}: "
+                f"{price}"
+            )
+        return True
+    return False
+
+
+def _check_stock(item: Dict[str, Any], size: str, stock: Any) -> int:
+    """Validate a stock level, which the snapshot stores as int64"""
+    if isinstance(stock, bool) or not isinstance(stock, int):
+        raise ValueError(
+            f"Unsupported stock for snapshot in {item['product_id']} "
+            f"size {size}: {stock!r}"
+        )
+    return stock
+
+
+def _source_stamp(data_file: Optional[str]) -> tuple:
+    """Return (size, mtime_ns) of the source JSON, or zeros if unknown"""
+    if not data_file:
+        return 0, 0
+    try:
+        stat = os.stat(data_file)
+    except OSError:
+        return 0, 0
+    return stat.st_size, stat.st_mtime_ns
+
+
+def write_snapshot(
+    data: Dict[str, Any],
+    snapshot_file: str,
+    source_file: Optional[str] = None,
+) -> None:
+    """
+    Serialize retail data and its name index into a snapshot file
+    Args:
+        data: Retail data with inventory, customers and orders
+        snapshot_file: Destination path, replaced atomically
+        source_file: JSON file the data came from, used for staleness checks
+    """
+    strings = _StringTable()
+    ids, names, categories, locations = [], [], [], []
+    prices, price_is_int = [], []
+    size_ix, size_labels, size_stock = [0], [], []
+    color_ix, colors = [0], []
+
+    for item in data.get("inventory", []):
+        extra = set(item) - _INVENTORY_KEYS
+        if extra:
+            raise ValueError(
+                f"Unsupported inventory fields for snapshot: {sorted(extra)}"
+            )
+        ids.append(strings.add(item["product_id"]))
+        names.append(strings.add(item["name"]))
+        categories.append(strings.add(item["category"]))
+        locations.append(strings.add(item["location"]))
+        price_is_int.append(_check_price(item))
+        prices.append(float(item["price"]))
+        for size, stock in item["sizes"].items():
+            size_labels.append(strings.add(size))
+            size_stock.append(_check_stock(item, size, stock))
+        size_ix.append(len(size_labels))
+        for color in item["colors"]:
+            colors.append(strings.add(color))
+        color_ix.append(len(colors))
+
+    index_text, index_starts = bytearray(), [0]
+    for item in data.get("inventory", []):
+        index_text += item["name"].lower().encode("utf-8") + b"\n"
+        index_starts.append(len(index_text))
+
+    sections = {
+        "strs.off": _column("Q", strings.offsets),
+        "strs.dat": b"".join(strings.chunks),
+        "inv.id": _column("I", ids),
+        "inv.name": _column("I", names),
+        "inv.cat": _column("I", categories),
+        "inv.loc": _column("I", locations),
+        "inv.prc": _column("d", prices),
+        "inv.prty": _column("B", price_is_int),
+        "inv.szix": _column("I", size_ix),
+        "inv.szlb": _column("I", size_labels),
+        "inv.szqt": _column("q", size_stock),
+        "inv.clix": _column("I", color_ix),
+        "inv.clr": _column("I", colors),
+        "idx.name": bytes(index_text),
+        "idx.noff": _column("Q", index_starts),
+        "customer": json.dumps(data.get("customers", [])).encode("utf-8"),
+        "orders": json.dumps(data.get("orders", [])).encode("utf-8"),
+    }
+
+    table_size = _SECTION.size * len(sections)
+    offset = _HEADER.size + table_size
+    table, payload = [], []
+    for name, blob in sections.items():
+        padding = -offset % _ALIGN
+        payload.append(b"\x00" * padding)
+        offset += padding
+        table.append(_SECTION.pack(name.encode("ascii"), offset, len(blob)))
+        payload.append(blob)
+        offset += len(blob)
+
+    body = b"".join(table) + b"".join(payload)
+    source_size, source_mtime = _source_stamp(source_file)
+    fields = (
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_VERSION,
+        0,
+        len(sections),
+        source_size,
+        source_mtime,
+    )
+    header = _HEADER.pack(*fields, 0)
+    header = _HEADER.pack(*fields, _checksum(header, body))
+
+    target = Path(snapshot_file)
+    fd, tmp_path = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            f.write(body)
+        os.replace(tmp_path, target)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+    logger.info("Wrote snapshot %s (%d bytes)", target, offset)
+
+
+class Snapshot:
+    """A memory-mapped snapshot with its decoded data and name index"""
+
+    def __init__(self, data: Dict[str, Any], name_index: NameIndex):
+        self.data = data
+        self.name_index = name_index
+
+
+def load_snapshot(snapshot_file: str, source_file: Optional[str] = None):
+    """
+    Memory-map a snapshot and expose it as retail data
+    Args:
+        snapshot_file: Snapshot path
+        source_file: JSON file the snapshot must match, if it exists
+    Returns:
+        Snapshot with data and name_index
+    Raises:
+        SnapshotError: If the snapshot is missing, corrupt or stale
+    """
+    try:
+        with open(snapshot_file, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"Cannot open snapshot {snapshot_file}: {e}")
+
+    if len(mapped) < _HEADER.size:
+        raise SnapshotError("Snapshot is truncated")
+    (
+        magic,
+        version,
+        _reserved,
+        section_count,
+        source_size,
+        source_mtime,
+        checksum,
+    ) = _HEADER.unpack_from(mapped, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotError("Not a retail snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot version {version}")
+
+    stamp = _source_stamp(source_file)
+    if stamp != (0, 0) and stamp != (source_size, source_mtime):
+        raise SnapshotError(f"Snapshot is older than {source_file}")
+
+    view = memoryview(mapped)
+    if _checksum(view[:_HEADER.size], view[_HEADER.size:]) != checksum:
+        raise SnapshotError("Snapshot checksum mismatch")
+    if _HEADER.size + section_count * _SECTION.size > len(mapped):
+        raise SnapshotError("Snapshot section table out of bounds")
+
+    sections, offsets = {}, {}
+    try:
+        for i in range(section_count):
+            name, offset, length = _SECTION.unpack_from(
+                mapped, _HEADER.size + i * _SECTION.size
+            )
+            if offset + length > len(mapped):
+                raise SnapshotError("Snapshot section out of bounds")
+            name = name.rstrip(b"\x00").decode("ascii")
+            sections[name] = view[offset:offset + length]
+            offsets[name] = offset
+    except (struct.error, UnicodeDecodeError) as e:
+        raise SnapshotError(f"Malformed snapshot section table: {e}")
+
+    try:
+        data = {
+            "inventory": SnapshotInventory(sections),
+            "customers": json.loads(bytes(sections["customer"])),
+            "orders": json.loads(bytes(sections["orders"])),
+        }
+        # find() runs on the mapping itself, so the index is addressed
+        # relative to where its text section starts in the file
+        name_index = NameIndex(
+            mapped, sections["idx.noff"].cast("Q"), offsets["idx.name"]
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        raise SnapshotError(f"Malformed snapshot: {e}")
+
+    if len(name_index) != len(data["inventory"]):
+        raise SnapshotError("Snapshot name index does not match inventory")
+    return Snapshot(data, name_index)
+
+
+def _synthetic_catalog(skus: int) -> Dict[str, Any]:
+    """Generate a catalog shaped like retail_data.json for benchmarking"""
+    brands = ["Nike", "Adidas", "Levi's", "Puma", "Reebok", "New Balance"]
+    categories = ["Footwear", "Apparel", "Accessories"]
+    locations = ["Warehouse A", "Warehouse B", "Warehouse C"]
+    colors = ["Black", "White", "Red", "Navy", "Grey", "Blue"]
+    inventory = []
+    for i in range(skus):
+        inventory.append(
+            {
+                "product_id": f"SKU-{i:07d}",
+                "name": f"{brands[i % len(brands)]} Model {i}",
+                "category": categories[i % len(categories)],
+                "sizes": {str(size): (i + size) % 25 for size in range(8, 13)},
+                "price": 50.0 + (i % 200),
+                "colors": colors[i % 4:i % 4 + 3],
+                "location": locations[i % len(locations)],
+            }
+        )
+    return {"inventory": inventory, "customers": [], "orders": []}
+
+
+def _bench(skus: int) -> None:
+    """Time cold JSON load against snapshot load for a synthetic catalog"""
+    from run_llamastack import RetailMCPTools
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = os.path.join(tmp, "retail_data.json")
+        snapshot_file = default_snapshot_path(data_file)
+        with open(data_file, "w") as f:
+            json.dump(_synthetic_catalog(skus), f)
+
+        start = time.perf_counter()
+        with open(data_file, "r") as f:
+            write_snapshot(json.load(f), snapshot_file, data_file)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        tools = RetailMCPTools(data_file, snapshot_file="")
+        json_time = time.perf_counter() - start
+        start = time.perf_counter()
+        tools.check_inventory("nike model 4242")
+        json_query = time.perf_counter() - start
+        del tools
+
+        start = time.perf_counter()
+        tools = RetailMCPTools(data_file, snapshot_file=snapshot_file)
+        snapshot_time = time.perf_counter() - start
+        start = time.perf_counter()
+        tools.check_inventory("nike model 4242")
+        snapshot_query = time.perf_counter() - start
+
+        print(f"SKUs:             {skus:,}")
+        print(f"JSON size:        {os.path.getsize(data_file):,} bytes")
+        print(f"Snapshot size:    {os.path.getsize(snapshot_file):,} bytes")
+        print(f"Snapshot build:   {build_time:.3f}s")
+        print(f"JSON load:        {json_time:.3f}s")
+        print(f"Snapshot load:    {snapshot_time:.3f}s")
+        print(f"Query (JSON):     {json_query * 1000:.1f}ms")
+        print(f"Query (snapshot): {snapshot_query * 1000:.1f}ms")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Build a snapshot from JSON")
+    build.add_argument("data_file", nargs="?", default="retail_data.json")
+    build.add_argument("-o", "--output", help="Snapshot path")
+
+    bench = commands.add_parser("bench", help="Benchmark JSON vs snapshot")
+    bench.add_argument("--skus", type=int, default=1_000_000)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "build":
+        with open(args.data_file, "r") as f:
+            data = json.load(f)
+        output = args.output or default_snapshot_path(args.data_file)
+        write_snapshot(data, output, args.data_file)
+    else:
+        _bench(args.skus)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,8 @@ This demo simulates LlamaStack functionality for retail operations
 import asyncio
 import json
 import logging
+import os
+import secrets
 from typing import Dict, Any, Optional
 
 from fastapi import FastAPI, Request, HTTPException
@@ -13,6 +15,20 @@ from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 import uvicorn
 
+from admission_control import (
+    AdmissionRejected,
+    client_key,
+    controller_from_env,
+    rate_limiter_from_env,
+)
+from request_profiling import profiler_from_env, span, traced
+from retail_snapshot import (
+    NameIndex,
+    SnapshotError,
+    default_snapshot_path,
+    load_snapshot,
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,6 +44,7 @@ class SimulatedLLMClient:
         self.model_name = "Llama-3.2-3B (Simulated)"
         logger.info("Initialized simulated LLM: %s", self.model_name)
 
+    @traced("llm.generate_response")
     async def generate_response(
         self, prompt: str, context: Optional[Dict[str, Any]] = None
     ) -> str:
@@ -49,6 +66,7 @@ class SimulatedLLMClient:
             "Ask me about inventory or customer service."
         )
 
+    @traced("llm.format_response")
     def _format_ai_response(
         self, tool_result: Dict[str, Any], intent: str
     ) -> str:
@@ -184,13 +202,32 @@ class RetailMCPTools:
     These tools allow the AI to interact with our mock retail data
     """
 
-    def __init__(self, data_file: str = "retail_data.json"):
-        """Initialize with retail data"""
+    def __init__(
+        self,
+        data_file: str = "retail_data.json",
+        snapshot_file: Optional[str] = None,
+    ):
+        """
+        Initialize with retail data
+        Args:
+            data_file: JSON file with inventory, customers and orders
+            snapshot_file: Binary snapshot to prefer over the JSON file.
+                Defaults to the .snap file next to data_file; pass an
+                empty string to always load JSON.
+        """
         self.data_file = data_file
+        self.snapshot_file = (
+            default_snapshot_path(data_file)
+            if snapshot_file is None
+            else snapshot_file
+        )
         self.load_data()
 
     def load_data(self):
-        """Load mock retail data from JSON file"""
+        """Load retail data from a valid snapshot, falling back to JSON"""
+        if self.snapshot_file and self.load_snapshot():
+            return
+
         try:
             with open(self.data_file, "r") as f:
                 self.data = json.load(f)
@@ -199,6 +236,24 @@ class RetailMCPTools:
             logger.error("Could not find %s", self.data_file)
             self.data = {"inventory": [], "customers": [], "orders": []}
 
+        self.name_index = NameIndex.build(
+            [item["name"] for item in self.data["inventory"]]
+        )
+
+    def load_snapshot(self) -> bool:
+        """Load retail data from the binary snapshot if it is usable"""
+        try:
+            snapshot = load_snapshot(self.snapshot_file, self.data_file)
+        except SnapshotError as e:
+            logger.info("Not using snapshot %s: %s", self.snapshot_file, e)
+            return False
+
+        self.data = snapshot.data
+        self.name_index = snapshot.name_index
+        logger.info("Loaded retail data from snapshot %s", self.snapshot_file)
+        return True
+
+    @traced("tool.check_inventory")
     def check_inventory(
         self, product_name: str, size: Optional[str] = None
     ) -> Dict[str, Any]:
@@ -212,29 +267,29 @@ class RetailMCPTools:
         """
         results = []
 
-        for item in self.data["inventory"]:
-            # Simple search - check if product_name is in item name
-            if product_name.lower() in item["name"].lower():
-                result = {
-                    "product_id": item["product_id"],
-                    "name": item["name"],
-                    "price": item["price"],
-                    "colors": item["colors"],
-                    "location": item["location"],
-                }
+        for row in self.name_index.match(product_name):
+            # Simple search - name index matches product_name as a substring
+            item = self.data["inventory"][row]
+            result = {
+                "product_id": item["product_id"],
+                "name": item["name"],
+                "price": item["price"],
+                "colors": item["colors"],
+                "location": item["location"],
+            }
 
-                if size:
-                    # Check specific size
-                    stock = item["sizes"].get(size, 0)
-                    result["size"] = size
-                    result["stock"] = stock
-                    result["available"] = stock > 0
-                else:
-                    # Show all sizes
-                    result["sizes"] = item["sizes"]
-                    result["total_stock"] = sum(item["sizes"].values())
+            if size:
+                # Check specific size
+                stock = item["sizes"].get(size, 0)
+                result["size"] = size
+                result["stock"] = stock
+                result["available"] = stock > 0
+            else:
+                # Show all sizes
+                result["sizes"] = item["sizes"]
+                result["total_stock"] = sum(item["sizes"].values())
 
-                results.append(result)
+            results.append(result)
 
         return {
             "query": f"{product_name}" + (f" size {size}" if size else ""),
@@ -242,6 +297,7 @@ class RetailMCPTools:
             "products": results,
         }
 
+    @traced("tool.get_customer_info")
     def get_customer_info(self, customer_name: str) -> Dict[str, Any]:
         """
         Get customer information and recent purchases
@@ -259,6 +315,7 @@ class RetailMCPTools:
             "message": f"Customer '{customer_name}' not found",
         }
 
+    @traced("tool.get_order_status")
     def get_order_status(
         self,
         order_id: Optional[str] = None,
@@ -313,6 +370,7 @@ class RetailAssistant:
         self.llm_client = SimulatedLLMClient()
         logger.info("Retail Assistant initialized successfully")
 
+    @traced("process_query")
     async def process_query(self, user_message: str) -> str:
         """
         Process user query using simulated LLM + MCP tools
@@ -324,17 +382,33 @@ class RetailAssistant:
         user_message_lower = user_message.lower()
 
         try:
-            # Intent recognition and tool calling
-            if any(
-                word in user_message_lower
-                for word in ["stock", "inventory", "available", "have"]
-            ):
+            # Intent recognition
+            with span("parse_intent") as intent_span:
+                if any(
+                    word in user_message_lower
+                    for word in ["stock", "inventory", "available", "have"]
+                ):
+                    intent = "inventory"
+                elif any(
+                    word in user_message_lower
+                    for word in [
+                        "customer",
+                        "order",
+                        "purchase",
+                        "bought",
+                        "ord-",
+                    ]
+                ):
+                    intent = "customer"
+                else:
+                    intent = "general"
+                intent_span.set_attribute("intent", intent)
+
+            # Tool calling
+            if intent == "inventory":
                 return await self._handle_inventory_query(user_message)
 
-            elif any(
-                word in user_message_lower
-                for word in ["customer", "order", "purchase", "bought", "ord-"]
-            ):
+            elif intent == "customer":
                 return await self._handle_customer_query(user_message)
 
             else:
@@ -350,6 +424,7 @@ class RetailAssistant:
                 "Please try again."
             )
 
+    @traced("handle_inventory_query")
     async def _handle_inventory_query(self, message: str) -> str:
         """Handle inventory-related queries using MCP tools"""
         # Extract product and size info
@@ -390,6 +465,7 @@ class RetailAssistant:
             context={"tool_result": tool_result, "intent": "inventory"},
         )
 
+    @traced("handle_customer_query")
     async def _handle_customer_query(self, message: str) -> str:
         """Handle customer service queries using MCP tools"""
         words = message.split()
@@ -446,19 +522,79 @@ app = FastAPI(title="Retail AI Assistant", version="1.0.0")
 # Initialize the assistant
 assistant = RetailAssistant()
 
+# Admission control for /chat so spikes are shed instead of queued forever
+admission = controller_from_env()
+rate_limiter = rate_limiter_from_env()
+
+# Opt-in per-request profiling (X-Profile header or PROFILE_SAMPLE_RATE)
+profiler = profiler_from_env()
+
+# Token for X-Profile and /admin endpoints; they stay closed while unset
+admin_token = os.getenv("ADMIN_TOKEN", "")
+
 # Templates for web interface
 templates = Jinja2Templates(directory="templates")
 
 
+def _is_admin(request: Request) -> bool:
+    """True if the request carries the configured X-Admin-Token"""
+    if not admin_token:
+        return False
+    return secrets.compare_digest(
+        request.headers.get("x-admin-token", ""), admin_token
+    )
+
+
+def _check_admin(request: Request):
+    """Require X-Admin-Token; admin endpoints are closed without a token"""
+    if not _is_admin(request):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
     """Serve the main demo interface"""
     return templates.TemplateResponse("index.html", {"request": request})
 
 
+def _rejection_response(rejected: AdmissionRejected) -> JSONResponse:
+    """Fast 429/503 response for requests refused by admission control"""
+    return JSONResponse(
+        {"response": rejected.reason, "status": "rejected"},
+        status_code=rejected.status_code,
+        headers={"Retry-After": str(rejected.retry_after)},
+    )
+
+
 @app.post("/chat")
 async def chat(request: Request):
-    """Handle chat requests"""
+    """Handle chat requests, profiling them when requested or sampled"""
+    with profiler.track_request():
+        # Only admins may ask for profiling; others can only be sampled
+        mode = profiler.mode_for(
+            request.headers, allow_header=_is_admin(request)
+        )
+        if mode is None:
+            return await _handle_chat(request)
+
+        with profiler.profile("POST /chat", mode) as trace:
+            response = await _handle_chat(request)
+            trace.root.set_attribute(
+                "http.status_code", response.status_code
+            )
+    response.headers["X-Trace-Id"] = trace.trace_id
+    return response
+
+
+async def _handle_chat(request: Request) -> JSONResponse:
+    """Rate limit, admit and answer a chat request"""
+    try:
+        rate_limiter.check(
+            client_key(request, rate_limiter.trusted_proxies)
+        )
+    except AdmissionRejected as rejected:
+        return _rejection_response(rejected)
+
     try:
         data = await request.json()
         user_message = data.get("message", "")
@@ -466,11 +602,15 @@ async def chat(request: Request):
         if not user_message:
             raise HTTPException(status_code=400, detail="Message is required")
 
-        # Process the message
-        response = await assistant.process_query(user_message)
+        # Process the message once a concurrency slot is free
+        async with admission.slot():
+            response = await assistant.process_query(user_message)
 
         return JSONResponse({"response": response, "status": "success"})
 
+    except AdmissionRejected as rejected:
+        return _rejection_response(rejected)
+
     except Exception as e:
         logger.error("Chat error: %s", e)
         return JSONResponse(
@@ -488,6 +628,33 @@ async def health_check():
     return {"status": "healthy", "service": "retail-ai-assistant"}
 
 
+@app.get("/admission")
+async def admission_stats():
+    """Queue depth and shed counters for /chat admission control"""
+    return admission.stats(rate_limiter)
+
+
+@app.get("/admin/profiles")
+async def list_profiles(request: Request):
+    """List recently profiled requests, newest first"""
+    _check_admin(request)
+    return {"profiles": profiler.recent()}
+
+
+@app.get("/admin/profiles/{trace_id}")
+async def get_profile(trace_id: str, request: Request):
+    """Return the OTLP span tree and cProfile output for one request"""
+    _check_admin(request)
+    trace = profiler.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return {
+        "summary": trace.summary(),
+        "trace": trace.to_otlp(),
+        "cprofile": trace.cprofile,
+    }
+
+
 if __name__ == "__main__":
     # Run the application
     uvicorn.run(app, host="0.0.0.0", port=8000)
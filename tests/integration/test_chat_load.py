@@ -0,0 +1,97 @@
+"""
+Load test for /chat admission control
+
+Drives the app in-process well past its concurrency limit and checks that
+latency stays bounded because excess requests are shed instead of queued.
+"""
+
+import asyncio
+import time
+import pytest
+import sys
+from pathlib import Path
+
+# Add the parent directory to sys.path to import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+httpx = pytest.importorskip("httpx")
+
+import run_llamastack
+from admission_control import AdmissionController, RateLimiter
+
+
+def p99(latencies):
+    """99th percentile of a list of latencies"""
+    ordered = sorted(latencies)
+    return ordered[max(0, int(len(ordered) * 0.99) - 1)]
+
+
+@pytest.mark.performance
+def test_chat_overload_keeps_p99_bounded(monkeypatch):
+    """Test p99 latency stays bounded when /chat is heavily overloaded"""
+    # Each simulated LLM call takes ~0.5s; allow 4 at once and 8 waiting.
+    # The queue timeout lets exactly one wave of waiters through: the
+    # first slots free up at ~0.5s, the next ones only at ~1.0s.
+    max_concurrent, max_queue = 4, 8
+    monkeypatch.setattr(
+        run_llamastack,
+        "admission",
+        AdmissionController(
+            max_concurrent=max_concurrent,
+            max_queue=max_queue,
+            queue_timeout=0.75,
+        ),
+    )
+    monkeypatch.setattr(
+        run_llamastack, "rate_limiter", RateLimiter(rate=0, burst=0)
+    )
+    requests = 200
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=run_llamastack.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test", timeout=30
+        ) as client:
+
+            async def chat(i):
+                started = time.perf_counter()
+                response = await client.post(
+                    "/chat",
+                    json={"message": "Do you have Nike shoes in stock?"},
+                )
+                return response, time.perf_counter() - started
+
+            async def health():
+                await asyncio.sleep(0.2)
+                started = time.perf_counter()
+                response = await client.get("/health")
+                return response, time.perf_counter() - started
+
+            chats = [chat(i) for i in range(requests)]
+            results = await asyncio.gather(health(), *chats)
+            stats = (await client.get("/admission")).json()
+            return results[0], results[1:], stats
+
+    (health, health_latency), results, stats = asyncio.run(scenario())
+
+    statuses = [response.status_code for response, _ in results]
+    latencies = [latency for _, latency in results]
+
+    # Slots run immediately, plus one wave drained from the queue in time
+    expected_admitted = max_concurrent + min(max_queue, max_concurrent)
+    assert statuses.count(200) == expected_admitted
+    assert stats["admitted"] == expected_admitted
+    assert set(statuses) == {200, 503}
+    shed = [
+        response for response, _ in results if response.status_code == 503
+    ]
+    assert all("Retry-After" in response.headers for response in shed)
+
+    # Worst case: wait out the queue timeout, then one LLM call
+    assert p99(latencies) < 2.0
+    assert stats["shed_queue_full"] + stats["shed_timeout"] == len(shed)
+
+    # The probe is never queued behind chat traffic
+    assert health.status_code == 200
+    assert health_latency < p99(latencies) / 2
+    assert stats["queue_depth"] == 0
@@ -0,0 +1,134 @@
+"""
+Integration tests for /chat profiling and the admin profile endpoints
+"""
+
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+
+# Add the parent directory to sys.path to import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+httpx = pytest.importorskip("httpx")
+
+import run_llamastack
+from request_profiling import RequestProfiler
+
+
+def send(*requests):
+    """Run (method, path, kwargs) requests against the app in order"""
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=run_llamastack.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            return [
+                await client.request(method, path, **kwargs)
+                for method, path, kwargs in requests
+            ]
+
+    return asyncio.run(scenario())
+
+
+@pytest.fixture
+def profiler(monkeypatch, tmp_path):
+    """Fresh profiler writing to a temporary trace file"""
+    profiler = RequestProfiler(trace_file=str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(run_llamastack, "profiler", profiler)
+    return profiler
+
+
+@pytest.mark.integration
+def test_unprofiled_chat_records_nothing(profiler):
+    """Test requests without X-Profile are not traced"""
+    (response,) = send(("POST", "/chat", {"json": {"message": "hello"}}))
+
+    assert response.status_code == 200
+    assert "X-Trace-Id" not in response.headers
+    assert profiler.recent() == []
+
+
+@pytest.mark.integration
+def test_profiled_chat_is_retrievable(profiler, monkeypatch):
+    """Test a profiled request can be fetched from the admin endpoint"""
+    monkeypatch.setattr(run_llamastack, "admin_token", "secret")
+    message = {"message": "Do you have Nike shoes in stock?"}
+
+    headers = {"X-Profile": "cprofile", "X-Admin-Token": "secret"}
+    (chat,) = send(("POST", "/chat", {"json": message, "headers": headers}))
+    trace_id = chat.headers["X-Trace-Id"]
+
+    forbidden, listing, detail = send(
+        ("GET", f"/admin/profiles/{trace_id}", {}),
+        ("GET", "/admin/profiles", {"headers": {"X-Admin-Token": "secret"}}),
+        (
+            "GET",
+            f"/admin/profiles/{trace_id}",
+            {"headers": {"X-Admin-Token": "secret"}},
+        ),
+    )
+
+    assert forbidden.status_code == 403
+    assert listing.json()["profiles"][0]["trace_id"] == trace_id
+
+    body = detail.json()
+    spans = body["trace"]["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    names = {s["name"] for s in spans}
+    assert {
+        "POST /chat",
+        "process_query",
+        "parse_intent",
+        "tool.check_inventory",
+        "llm.format_response",
+    } <= names
+    assert "function calls" in body["cprofile"]
+
+
+@pytest.mark.integration
+def test_profile_header_requires_admin_token(profiler, monkeypatch):
+    """Test anonymous clients cannot switch on profiling"""
+    monkeypatch.setattr(run_llamastack, "admin_token", "secret")
+    message = {"message": "hello"}
+
+    no_token, wrong_token = send(
+        (
+            "POST",
+            "/chat",
+            {"json": message, "headers": {"X-Profile": "cprofile"}},
+        ),
+        (
+            "POST",
+            "/chat",
+            {
+                "json": message,
+                "headers": {"X-Profile": "1", "X-Admin-Token": "guess"},
+            },
+        ),
+    )
+
+    assert no_token.status_code == 200
+    assert "X-Trace-Id" not in no_token.headers
+    assert "X-Trace-Id" not in wrong_token.headers
+    assert profiler.recent() == []
+
+
+@pytest.mark.integration
+def test_admin_endpoints_closed_without_token(profiler, monkeypatch):
+    """Test admin endpoints fail closed when ADMIN_TOKEN is not configured"""
+    monkeypatch.setattr(run_llamastack, "admin_token", "")
+    headers = {"X-Admin-Token": ""}
+
+    responses = send(
+        ("GET", "/admin/profiles", {"headers": headers}),
+        ("GET", "/admin/profiles/abc", {"headers": headers}),
+        (
+            "POST",
+            "/chat",
+            {"json": {"message": "hello"}, "headers": {"X-Profile": "1"}},
+        ),
+    )
+
+    assert [r.status_code for r in responses[:2]] == [403, 403]
+    assert "X-Trace-Id" not in responses[2].headers
@@ -0,0 +1,73 @@
+"""
+Integration tests for per-client rate limiting on /chat
+"""
+
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+
+# Add the parent directory to sys.path to import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+httpx = pytest.importorskip("httpx")
+
+import run_llamastack
+from admission_control import (
+    AdmissionController,
+    RateLimiter,
+    parse_trusted_proxies,
+)
+
+ROUTER = ("10.128.2.1", 40000)
+
+
+@pytest.mark.integration
+def test_clients_behind_trusted_router_get_separate_buckets(monkeypatch):
+    """Test two users behind the router are limited independently"""
+    monkeypatch.setattr(
+        run_llamastack,
+        "admission",
+        AdmissionController(max_concurrent=8, max_queue=8, queue_timeout=5),
+    )
+    monkeypatch.setattr(
+        run_llamastack,
+        "rate_limiter",
+        RateLimiter(
+            rate=0.1,
+            burst=2,
+            trusted_proxies=parse_trusted_proxies("10.128.0.0/14"),
+        ),
+    )
+
+    async def scenario():
+        transport = httpx.ASGITransport(
+            app=run_llamastack.app, client=ROUTER
+        )
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+
+            def chat(user):
+                return client.post(
+                    "/chat",
+                    json={"message": "hello"},
+                    headers={"X-Forwarded-For": user},
+                )
+
+            first = await asyncio.gather(
+                *(chat("203.0.113.1") for _ in range(3))
+            )
+            second = await asyncio.gather(
+                *(chat("203.0.113.2") for _ in range(2))
+            )
+            stats = (await client.get("/admission")).json()
+            return first, second, stats
+
+    first, second, stats = asyncio.run(scenario())
+
+    assert sorted(r.status_code for r in first) == [200, 200, 429]
+    limited = next(r for r in first if r.status_code == 429)
+    assert int(limited.headers["Retry-After"]) >= 1
+    assert [r.status_code for r in second] == [200, 200]
+    assert stats["rate_limited"] == 1
@@ -0,0 +1,169 @@
+"""
+Unit tests for /chat admission control
+"""
+
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add the parent directory to sys.path to import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from admission_control import (
+    AdmissionController,
+    AdmissionRejected,
+    RateLimiter,
+    client_key,
+    parse_trusted_proxies,
+)
+
+
+class FakeRequest:
+    """Minimal stand-in for a Starlette request"""
+
+    def __init__(self, peer, forwarded=None):
+        self.client = SimpleNamespace(host=peer)
+        self.headers = {}
+        if forwarded is not None:
+            self.headers["x-forwarded-for"] = forwarded
+
+
+class TestClientKey:
+    """Test client identification for rate limiting"""
+
+    def test_spoofed_header_from_untrusted_peer_ignored(self):
+        """Test X-Forwarded-For is ignored unless the peer is a proxy"""
+        trusted = parse_trusted_proxies("10.128.0.0/14")
+        request = FakeRequest("192.168.1.50", forwarded="1.2.3.4")
+
+        assert client_key(request, trusted) == "192.168.1.50"
+        assert client_key(request) == "192.168.1.50"
+
+    def test_trusted_proxy_header_honoured(self):
+        """Test the client address is taken from a trusted proxy chain"""
+        trusted = parse_trusted_proxies("10.128.0.0/14, 10.0.0.1")
+        request = FakeRequest(
+            "10.128.2.1", forwarded="6.6.6.6, 203.0.113.7, 10.0.0.1"
+        )
+
+        assert client_key(request, trusted) == "203.0.113.7"
+
+
+class TestRateLimiter:
+    """Test per-client token bucket rate limiting"""
+
+    def test_burst_then_reject(self):
+        """Test a client is limited once its burst is used up"""
+        limiter = RateLimiter(rate=1.0, burst=3)
+
+        for _ in range(3):
+            limiter.check("10.0.0.1")
+
+        with pytest.raises(AdmissionRejected) as exc_info:
+            limiter.check("10.0.0.1")
+
+        assert exc_info.value.status_code == 429
+        assert exc_info.value.retry_after >= 1
+        assert limiter.rejected == 1
+
+    def test_clients_are_independent(self):
+        """Test one noisy client does not limit another"""
+        limiter = RateLimiter(rate=1.0, burst=1)
+
+        limiter.check("10.0.0.1")
+        with pytest.raises(AdmissionRejected):
+            limiter.check("10.0.0.1")
+
+        limiter.check("10.0.0.2")
+
+    def test_client_table_is_bounded(self):
+        """Test the least recently seen client is evicted"""
+        limiter = RateLimiter(rate=1.0, burst=1, max_clients=2)
+
+        for key in ["a", "b", "c"]:
+            limiter.check(key)
+
+        assert list(limiter.buckets) == ["b", "c"]
+
+    def test_zero_rate_disables_limiting(self):
+        """Test a rate of zero turns rate limiting off"""
+        limiter = RateLimiter(rate=0, burst=0)
+
+        for _ in range(100):
+            limiter.check("10.0.0.1")
+
+
+class TestAdmissionController:
+    """Test bounded concurrency and load shedding"""
+
+    def test_queue_full_is_shed(self):
+        """Test requests beyond the wait queue are rejected immediately"""
+
+        async def scenario():
+            controller = AdmissionController(
+                max_concurrent=1, max_queue=1, queue_timeout=5.0
+            )
+            release = asyncio.Event()
+
+            async def hold():
+                async with controller.slot():
+                    await release.wait()
+
+            holder = asyncio.create_task(hold())
+            waiter = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            await asyncio.sleep(0)
+
+            assert controller.active == 1
+            assert controller.queued == 1
+
+            with pytest.raises(AdmissionRejected) as exc_info:
+                async with controller.slot():
+                    pass
+
+            release.set()
+            await asyncio.gather(holder, waiter)
+            return controller, exc_info.value
+
+        controller, rejected = asyncio.run(scenario())
+
+        assert rejected.status_code == 503
+        assert controller.shed_queue_full == 1
+        assert controller.admitted == 2
+        assert controller.active == 0
+        assert controller.queued == 0
+
+    def test_queue_timeout_is_shed(self):
+        """Test a request that waits too long for a slot is rejected"""
+
+        async def scenario():
+            controller = AdmissionController(
+                max_concurrent=1, max_queue=5, queue_timeout=0.05
+            )
+            release = asyncio.Event()
+
+            async def hold():
+                async with controller.slot():
+                    await release.wait()
+
+            holder = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+
+            with pytest.raises(AdmissionRejected):
+                async with controller.slot():
+                    pass
+
+            release.set()
+            await holder
+            return controller
+
+        controller = asyncio.run(scenario())
+
+        assert controller.shed_timeout == 1
+        assert controller.stats()["queue_depth"] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
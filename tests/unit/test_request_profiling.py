@@ -0,0 +1,232 @@
+"""
+Unit tests for per-request profiling
+"""
+
+import asyncio
+import json
+import pytest
+import sys
+import threading
+from pathlib import Path
+
+# Add the parent directory to sys.path to import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+import request_profiling
+from request_profiling import RequestProfiler, span, traced
+from run_llamastack import RetailAssistant, RetailMCPTools
+
+
+def span_names(trace):
+    """Map span name to its parent span name"""
+    by_id = {s.span_id: s for s in trace.spans}
+    return {
+        s.name: by_id[s.parent_id].name if s.parent_id else None
+        for s in trace.spans
+    }
+
+
+class TestSpans:
+    """Test span recording"""
+
+    def test_noop_without_active_trace(self):
+        """Test spans and traced functions are inert when not profiling"""
+
+        @traced("work")
+        def work():
+            return 42
+
+        with span("unused") as s:
+            s.set_attribute("ignored", True)
+
+        assert work() == 42
+
+    def test_span_tree(self):
+        """Test nested sync and async spans record their parents"""
+        profiler = RequestProfiler()
+
+        @traced("inner")
+        def inner():
+            return "done"
+
+        @traced("outer")
+        async def outer():
+            with span("stage", step=1):
+                return inner()
+
+        with profiler.profile("root") as trace:
+            assert asyncio.run(outer()) == "done"
+
+        assert span_names(trace) == {
+            "root": None,
+            "outer": "root",
+            "stage": "outer",
+            "inner": "stage",
+        }
+        assert all(s.end_ns >= s.start_ns for s in trace.spans)
+
+    def test_error_status(self):
+        """Test a failing span is marked as an error"""
+        profiler = RequestProfiler()
+
+        with pytest.raises(ValueError):
+            with profiler.profile("root") as trace:
+                with span("broken"):
+                    raise ValueError("boom")
+
+        otlp_spans = trace.to_otlp()["resourceSpans"][0]["scopeSpans"][0][
+            "spans"
+        ]
+        assert all(s["status"]["code"] == 2 for s in otlp_spans)
+
+
+class TestRequestProfiler:
+    """Test profiling decisions, export and retention"""
+
+    def test_mode_for(self):
+        """Test header opt-in and sampling"""
+        assert RequestProfiler().mode_for({}) is None
+        assert RequestProfiler().mode_for({"x-profile": "1"}) == "trace"
+        assert (
+            RequestProfiler().mode_for({"x-profile": "cprofile"})
+            == "cprofile"
+        )
+        assert RequestProfiler(sample_rate=1.0).mode_for({}) == "trace"
+        assert (
+            RequestProfiler().mode_for(
+                {"x-profile": "cprofile"}, allow_header=False
+            )
+            is None
+        )
+
+    def test_cprofile_output(self):
+        """Test cProfile statistics are captured in cprofile mode"""
+        profiler = RequestProfiler()
+
+        with profiler.profile("root", "cprofile") as trace:
+            sum(range(1000))
+
+        assert "function calls" in trace.cprofile
+        assert trace.summary()["cprofile_scope"] == "thread"
+
+    def test_cprofile_counts_overlapping_requests(self):
+        """Test cProfile output records the requests it may include"""
+        profiler = RequestProfiler()
+
+        async def request(mode, delay):
+            with profiler.track_request():
+                if mode is None:
+                    await asyncio.sleep(delay)
+                    return None
+                with profiler.profile("root", mode) as trace:
+                    await asyncio.sleep(delay)
+                return trace
+
+        async def scenario():
+            return await asyncio.gather(
+                request("cprofile", 0.05),
+                request(None, 0.01),
+                request(None, 0.01),
+            )
+
+        trace = asyncio.run(scenario())[0]
+
+        attributes = trace.root.attributes
+        assert attributes["profile.cprofile_overlapping_requests"] == 2
+        assert profiler.in_flight == 0
+
+    def test_export_otlp_json_lines(self, tmp_path):
+        """Test traces are appended to the trace file as OTLP/JSON"""
+        trace_file = tmp_path / "traces" / "traces.jsonl"
+        profiler = RequestProfiler(trace_file=str(trace_file))
+
+        for _ in range(2):
+            with profiler.profile("root") as trace:
+                with span("stage", rows=3):
+                    pass
+        profiler.close()
+
+        lines = trace_file.read_text().splitlines()
+        assert len(lines) == 2
+
+        document = json.loads(lines[-1])
+        resource_spans = document["resourceSpans"][0]
+        assert resource_spans["resource"]["attributes"][0]["key"] == (
+            "service.name"
+        )
+        spans = resource_spans["scopeSpans"][0]["spans"]
+        assert {s["traceId"] for s in spans} == {trace.trace_id}
+        assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+        assert spans[1]["attributes"] == [
+            {"key": "rows", "value": {"intValue": "3"}}
+        ]
+
+    def test_export_runs_off_the_calling_thread(self, tmp_path, monkeypatch):
+        """Test trace encoding and file writes happen on the listener"""
+        threads = []
+        original = request_profiling._OtlpJsonFormatter.format
+
+        def format(self, record):
+            threads.append(threading.current_thread())
+            return original(self, record)
+
+        monkeypatch.setattr(
+            request_profiling._OtlpJsonFormatter, "format", format
+        )
+        profiler = RequestProfiler(trace_file=str(tmp_path / "traces.jsonl"))
+
+        with profiler.profile("root"):
+            pass
+        profiler.close()
+
+        # The rotating handler also formats once to check the file size
+        assert threads
+        assert threading.current_thread() not in threads
+
+    def test_export_failure_keeps_trace(self, tmp_path, caplog):
+        """Test an unwritable trace file disables export once"""
+        blocker = tmp_path / "not-a-directory"
+        blocker.write_text("")
+        profiler = RequestProfiler(trace_file=str(blocker / "traces.jsonl"))
+
+        for _ in range(2):
+            with profiler.profile("root") as trace:
+                pass
+
+        assert profiler.get(trace.trace_id) is trace
+        assert profiler.trace_file == ""
+        warnings = [r for r in caplog.records if r.levelname == "WARNING"]
+        assert len(warnings) == 1
+
+    def test_retention_is_bounded(self):
+        """Test only the most recent traces are kept"""
+        profiler = RequestProfiler(keep=2)
+
+        for _ in range(3):
+            with profiler.profile("root"):
+                pass
+
+        assert len(profiler.recent()) == 2
+
+
+class TestAssistantInstrumentation:
+    """Test the assistant stages show up in a profile"""
+
+    def test_inventory_query_spans(self, temp_data_file):
+        """Test intent parsing, tool call and formatting are recorded"""
+        assistant = RetailAssistant()
+        assistant.tools = RetailMCPTools(temp_data_file)
+        profiler = RequestProfiler()
+
+        with profiler.profile("root") as trace:
+            asyncio.run(assistant.process_query("Do you have Nike in stock?"))
+
+        parents = span_names(trace)
+        assert parents["process_query"] == "root"
+        assert parents["parse_intent"] == "process_query"
+        assert parents["tool.check_inventory"] == "handle_inventory_query"
+        assert parents["llm.format_response"] == "llm.generate_response"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
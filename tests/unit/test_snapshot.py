@@ -0,0 +1,170 @@
+"""
+Unit tests for the binary retail data snapshot
+"""
+
+import json
+import pytest
+import struct
+import sys
+from pathlib import Path
+
+# Add the parent directory to sys.path to import our modules
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from retail_snapshot import (
+    _CRC_OFFSET,
+    _HEADER,
+    _checksum,
+    NameIndex,
+    SnapshotError,
+    default_snapshot_path,
+    load_snapshot,
+    write_snapshot,
+)
+from run_llamastack import RetailMCPTools
+
+
+@pytest.fixture
+def snapshot_file(temp_data_file, sample_retail_data):
+    """Build a snapshot next to the temporary retail data file"""
+    path = default_snapshot_path(temp_data_file)
+    write_snapshot(sample_retail_data, path, temp_data_file)
+
+    yield path
+
+    # Cleanup
+    Path(path).unlink(missing_ok=True)
+
+
+class TestNameIndex:
+    """Test NameIndex substring matching"""
+
+    def test_match_is_case_insensitive(self):
+        """Test matching ignores case like the original name scan"""
+        index = NameIndex.build(["Nike Air", "Adidas Boost", "Nike Run"])
+
+        assert index.match("NIKE") == [0, 2]
+        assert index.match("boost") == [1]
+        assert index.match("puma") == []
+
+    def test_match_empty_query_returns_all(self):
+        """Test an empty query matches every product"""
+        index = NameIndex.build(["Nike Air", "Adidas Boost"])
+
+        assert index.match("") == [0, 1]
+
+    def test_match_does_not_span_names(self):
+        """Test a query never matches across two adjacent names"""
+        index = NameIndex.build(["Nike", "Air"])
+
+        assert index.match("nike\nair") == []
+        assert index.match("keai") == []
+
+
+class TestSnapshot:
+    """Test snapshot round trip and validation"""
+
+    def test_round_trip(
+        self, snapshot_file, temp_data_file, sample_retail_data
+    ):
+        """Test a snapshot reproduces the source data"""
+        snapshot = load_snapshot(snapshot_file, temp_data_file)
+        inventory = list(snapshot.data["inventory"])
+
+        assert inventory == sample_retail_data["inventory"]
+        for loaded, source in zip(inventory, sample_retail_data["inventory"]):
+            assert type(loaded["price"]) is type(source["price"])
+            assert all(
+                type(stock) is int for stock in loaded["sizes"].values()
+            )
+        assert snapshot.data["customers"] == sample_retail_data["customers"]
+        assert snapshot.data["orders"] == sample_retail_data["orders"]
+        assert snapshot.name_index.match("nike") == [0]
+
+    def test_int_price_round_trip(self, tmp_path, sample_retail_data):
+        """Test an integer price stays an int instead of becoming a float"""
+        item = dict(sample_retail_data["inventory"][0], price=120)
+        path = str(tmp_path / "retail_data.snap")
+        write_snapshot({"inventory": [item]}, path)
+
+        loaded = load_snapshot(path).data["inventory"][0]
+
+        assert loaded == item
+        assert type(loaded["price"]) is int
+
+    def test_unsupported_values_rejected(self, tmp_path, sample_retail_data):
+        """Test values the columns cannot hold fail the build clearly"""
+        path = str(tmp_path / "retail_data.snap")
+        item = sample_retail_data["inventory"][0]
+
+        with pytest.raises(ValueError, match="stock"):
+            write_snapshot(
+                {"inventory": [dict(item, sizes={"9": 1.5})]}, path
+            )
+        with pytest.raises(ValueError, match="price"):
+            write_snapshot({"inventory": [dict(item, price="100")]}, path)
+
+    def test_corrupt_snapshot_rejected(self, snapshot_file, temp_data_file):
+        """Test a checksum mismatch is detected"""
+        raw = bytearray(Path(snapshot_file).read_bytes())
+        raw[-1] ^= 0xFF
+        Path(snapshot_file).write_bytes(bytes(raw))
+
+        with pytest.raises(SnapshotError, match="checksum"):
+            load_snapshot(snapshot_file, temp_data_file)
+
+    def test_corrupt_header_rejected(self, snapshot_file, temp_data_file):
+        """Test header fields are covered by the checksum"""
+        raw = bytearray(Path(snapshot_file).read_bytes())
+        # section_count lives right after magic, version and reserved
+        struct.pack_into("<I", raw, 12, 1000)
+        Path(snapshot_file).write_bytes(bytes(raw))
+
+        with pytest.raises(SnapshotError, match="checksum"):
+            load_snapshot(snapshot_file, temp_data_file)
+
+        tools = RetailMCPTools(temp_data_file)
+        assert isinstance(tools.data["inventory"], list)
+
+    def test_section_table_out_of_bounds(self, snapshot_file, temp_data_file):
+        """Test a bad section count is rejected even with a valid checksum"""
+        raw = bytearray(Path(snapshot_file).read_bytes())
+        struct.pack_into("<I", raw, 12, 1000)
+        checksum = _checksum(raw[:_HEADER.size], raw[_HEADER.size:])
+        struct.pack_into("<I", raw, _CRC_OFFSET, checksum)
+        Path(snapshot_file).write_bytes(bytes(raw))
+
+        with pytest.raises(SnapshotError, match="out of bounds"):
+            load_snapshot(snapshot_file, temp_data_file)
+
+    def test_stale_snapshot_rejected(
+        self, snapshot_file, temp_data_file, sample_retail_data
+    ):
+        """Test a snapshot is ignored once the JSON file changes"""
+        with open(temp_data_file, "w") as f:
+            json.dump(sample_retail_data, f, indent=2)
+
+        with pytest.raises(SnapshotError, match="older"):
+            load_snapshot(snapshot_file, temp_data_file)
+
+    def test_tools_prefer_snapshot(self, snapshot_file, temp_data_file):
+        """Test RetailMCPTools loads from a valid snapshot"""
+        tools = RetailMCPTools(temp_data_file)
+
+        assert not isinstance(tools.data["inventory"], list)
+        result = tools.check_inventory("nike", "9")
+        assert result["found"] is True
+        assert result["products"][0]["stock"] == 10
+
+    def test_tools_fall_back_to_json(self, snapshot_file, temp_data_file):
+        """Test RetailMCPTools falls back to JSON for an invalid snapshot"""
+        Path(snapshot_file).write_bytes(b"not a snapshot")
+
+        tools = RetailMCPTools(temp_data_file)
+
+        assert isinstance(tools.data["inventory"], list)
+        assert tools.check_inventory("nike")["found"] is True
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])